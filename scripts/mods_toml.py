@@ -1,7 +1,7 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
-# dependencies = []
+# dependencies = ["rtoml"]
 # ///
 """Validate and optionally export mods.toml [mc-publish] metadata."""
 
@@ -9,11 +9,19 @@ from __future__ import annotations
 
 import argparse
 import os
+import re
 import sys
-import tomllib
+from collections import deque
 from pathlib import Path
 from typing import NoReturn, cast
 
+try:
+    from rtoml import TomlParsingError as TOMLDecodeError
+    from rtoml import loads as toml_loads
+except ImportError:  # no native wheel for this platform
+    from tomllib import TOMLDecodeError
+    from tomllib import loads as toml_loads
+
 REQUIRED_KEYS = [
     "modrinth",
     "curseforge",
@@ -23,6 +31,17 @@ REQUIRED_KEYS = [
     "curseforge_slug",
 ]
 ALLOWED_LOADERS = {"forge"}
+PRUNED_DIRS = {".git", ".gradle", "build", "node_modules", "out", "run", "target"}
+OUTPUT_TEMPLATE = (
+    "modrinth_id={modrinth}\n"
+    "curseforge_id={curseforge}\n"
+    "loader={loader}\n"
+    "mc_version={mc_version}\n"
+    "modrinth_slug={modrinth_slug}\n"
+    "curseforge_slug={curseforge_slug}\n"
+)
+MC_PUBLISH_HEADER = re.compile(r"^[ \t]*\[mc-publish\][ \t\r]*(?:#.*)?$", re.MULTILINE)
+NEXT_TABLE_HEADER = re.compile(r"^[ \t]*\[(?!\[?mc-publish)[^\n]*\][ \t\r]*(?:#.*)?$", re.MULTILINE)
 
 
 def fail(message: str) -> NoReturn:
@@ -30,8 +49,26 @@ def fail(message: str) -> NoReturn:
     sys.exit(1)
 
 
+def walk_mods_toml(root: Path) -> list[Path]:
+    paths: list[Path] = []
+    pending = deque([os.fspath(root)])
+    while pending:
+        try:
+            scanner = os.scandir(pending.popleft())
+        except OSError:  # unreadable directory; skip it as Path.rglob did
+            continue
+        with scanner as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in PRUNED_DIRS:
+                        pending.append(entry.path)
+                elif entry.name == "mods.toml" and entry.is_file():
+                    paths.append(Path(entry.path))
+    return paths
+
+
 def find_mods_toml(root: Path) -> Path:
-    paths = [path for path in root.rglob("mods.toml") if path.is_file() and "build" not in path.parts]
+    paths = walk_mods_toml(root)
     if not paths:
         fail("No mods.toml found. Expected a single mods.toml with a [mc-publish] table containing required keys.")
     if len(paths) > 1:
@@ -40,54 +77,37 @@ def find_mods_toml(root: Path) -> Path:
     return paths[0]
 
 
-def strip_inline_comment(line: str) -> str:
-    return line.split("#", 1)[0].strip()
-
-
-def is_table_header(line: str) -> bool:
-    stripped = strip_inline_comment(line)
-    return stripped.startswith("[") and stripped.endswith("]")
-
-
-def is_mc_publish_header(line: str) -> bool:
-    stripped = strip_inline_comment(line)
-    return stripped.startswith("[mc-publish") or stripped.startswith("[[mc-publish")
-
-
 def extract_mc_publish_block(text: str) -> str:
-    lines = text.splitlines()
-    header_indices = [index for index, line in enumerate(lines) if strip_inline_comment(line) == "[mc-publish]"]
-    if not header_indices:
+    headers = list(MC_PUBLISH_HEADER.finditer(text))
+    if not headers:
         fail("Missing [mc-publish] table in mods.toml")
-    if len(header_indices) > 1:
+    if len(headers) > 1:
         fail("Multiple [mc-publish] tables found in mods.toml")
 
-    start_index = header_indices[0]
-    end_index = len(lines)
-    for index in range(start_index + 1, len(lines)):
-        if is_table_header(lines[index]) and not is_mc_publish_header(lines[index]):
-            end_index = index
-            break
-
-    block_lines = lines[start_index:end_index]
-    return "\n".join(block_lines) + "\n"
+    start = headers[0].start()
+    next_header = NEXT_TABLE_HEADER.search(text, headers[0].end())
+    end = next_header.start() if next_header else len(text)
+    return text[start:end]
 
 
 def normalize_value(value: object | None) -> str | None:
-    if value is None:
-        return None
-    if isinstance(value, str):
-        stripped = value.strip()
-        return stripped if stripped else None
-    return str(value)
+    # TOML parsers return plain str for string values, so an exact class check is enough.
+    if value.__class__ is str:
+        return cast(str, value).strip() or None
+    return None if value is None else str(value)
 
 
-def read_metadata(mods_toml: Path) -> dict[str, str]:
+def read_metadata(mods_toml: Path) -> dict[str, object]:
+    text = mods_toml.read_text(encoding="utf-8")
     try:
-        block_text = extract_mc_publish_block(mods_toml.read_text())
-        data = tomllib.loads(block_text)
-    except tomllib.TOMLDecodeError as exc:
-        fail(f"Invalid TOML in {mods_toml}: {exc}")
+        data = toml_loads(text)
+    except TOMLDecodeError:
+        # Gradle-templated files (e.g. `[[dependencies.${mod_id}]]`) are not valid TOML as a
+        # whole; only the [mc-publish] table has to be, so retry with just that table.
+        try:
+            data = toml_loads(extract_mc_publish_block(text))
+        except TOMLDecodeError as exc:
+            fail(f"Invalid TOML in {mods_toml}: {exc}")
 
     metadata = data.get("mc-publish")
     if metadata is None:
@@ -98,7 +118,6 @@ def read_metadata(mods_toml: Path) -> dict[str, str]:
     metadata_dict = cast(dict[str, object], metadata)
 
     missing: list[str] = []
-    values: dict[str, str] = {}
     for key in REQUIRED_KEYS:
         value = normalize_value(metadata_dict.get(key))
         if value is None:
@@ -106,31 +125,33 @@ def read_metadata(mods_toml: Path) -> dict[str, str]:
             continue
         if "${" in value:
             fail(f"[mc-publish].{key} contains a template placeholder: {value}")
-        values[key] = value
+        metadata_dict[key] = value
 
     if missing:
         missing_list = ", ".join(f"[mc-publish].{key}" for key in missing)
         fail(f"Missing required keys in {mods_toml}: {missing_list}")
 
-    loader = values["loader"]
+    loader = metadata_dict["loader"]
     if loader not in ALLOWED_LOADERS:
         allowed_list = ", ".join(sorted(ALLOWED_LOADERS))
         fail(f"[mc-publish].loader must be one of: {allowed_list}. Found: {loader}")
 
-    return values
+    return metadata_dict
 
 
-def write_outputs(values: dict[str, str]) -> None:
+def write_outputs(values: dict[str, object]) -> None:
     output_path = os.environ.get("GITHUB_OUTPUT")
     if not output_path:
         fail("GITHUB_OUTPUT is not set; cannot write outputs.")
-    with Path(output_path).open("a") as output:
-        output.write(f"modrinth_id={values['modrinth']}\n")
-        output.write(f"curseforge_id={values['curseforge']}\n")
-        output.write(f"loader={values['loader']}\n")
-        output.write(f"mc_version={values['mc_version']}\n")
-        output.write(f"modrinth_slug={values['modrinth_slug']}\n")
-        output.write(f"curseforge_slug={values['curseforge_slug']}\n")
+    payload = memoryview(OUTPUT_TEMPLATE.format_map(values).encode())
+    # One write on an O_APPEND descriptor keeps the block of lines from interleaving with other writers;
+    # keep writing the remainder if the kernel accepts only part of it.
+    fd = os.open(output_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        while payload:
+            payload = payload[os.write(fd, payload) :]
+    finally:
+        os.close(fd)
 
 
 def main() -> int:
@@ -1,11 +1,14 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
-# dependencies = ["httpx"]
+# dependencies = ["httpx[http2]"]
 # ///
 """Sync a mod to a packwiz modpack - add or update with version polling."""
 
+import functools
 import os
+import random
+import re
 import subprocess
 import sys
 import time
@@ -13,14 +16,42 @@ from pathlib import Path
 
 import httpx
 
-MAX_RETRIES = 20
-RETRY_INTERVAL = 60
+MAX_RETRIES = 24
+INITIAL_RETRY_INTERVAL = 10
+MAX_RETRY_INTERVAL = 60
+RETRY_BACKOFF = 1.5
+# packwiz format: slug = "mod-slug"
+SLUG_PATTERN = re.compile(rb'^[ \t]*slug[ \t]*=[ \t]*"([^"]+)"', re.MULTILINE)
+
+# Shared across polling attempts so retries reuse one TLS connection instead of handshaking each time
+HTTP_CLIENT = httpx.Client(
+    http2=True,
+    timeout=10,
+    headers={"User-Agent": "game-design-driven/mod-release-workflow"},
+    limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=120),
+)
 
 
 def log(msg: str) -> None:
     print(f"[sync] {msg}", flush=True)
 
 
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff capped at MAX_RETRY_INTERVAL, with +/-20% jitter."""
+    delay = min(MAX_RETRY_INTERVAL, INITIAL_RETRY_INTERVAL * RETRY_BACKOFF ** (attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def wait_for_retry(attempt: int, reason: str) -> None:
+    """Log why the attempt failed and sleep before the next one."""
+    if attempt >= MAX_RETRIES:
+        log(f"Attempt {attempt}/{MAX_RETRIES}: {reason}")
+        return
+    delay = retry_delay(attempt)
+    log(f"Attempt {attempt}/{MAX_RETRIES}: {reason}, waiting {delay:.0f}s...")
+    time.sleep(delay)
+
+
 def run_packwiz(cmd: list[str], cwd: Path) -> tuple[bool, str]:
     """Run packwiz command, return (success, output)."""
     try:
@@ -44,31 +75,39 @@ def has_git_changes(cwd: Path) -> bool:
     result = subprocess.run(
         ["git", "diff", "--quiet", "."],
         cwd=cwd,
-        capture_output=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
     )
     return result.returncode != 0
 
 
+@functools.cache
+def pack_slugs(pack_dir: str) -> frozenset[str]:
+    """Collect the slugs of all mods in the pack, scanning its mods/ directory once per run."""
+    try:
+        entries = os.scandir(os.path.join(pack_dir, "mods"))
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
+    slugs: set[str] = set()
+    with entries:
+        for entry in entries:
+            if entry.name.endswith(".pw.toml") and entry.is_file():
+                with open(entry.path, "rb") as f:
+                    slugs.update(slug.decode() for slug in SLUG_PATTERN.findall(f.read()))
+    return frozenset(slugs)
+
+
 def mod_exists_in_pack(mod_slug: str, pack_dir: Path) -> bool:
     """Check if mod exists in pack by looking for its .pw.toml file."""
-    mods_dir = pack_dir / "mods"
-    if not mods_dir.exists():
-        return False
-    for toml_file in mods_dir.glob("*.pw.toml"):
-        content = toml_file.read_text()
-        # packwiz format: slug = "mod-slug"
-        if f'slug = "{mod_slug}"' in content:
-            return True
-    return False
+    return mod_slug in pack_slugs(str(pack_dir.resolve()))
 
 
 def check_modrinth_version(slug: str, version: str, mc_version: str, loader: str) -> bool:
     """Check if version exists on Modrinth."""
     try:
-        resp = httpx.get(
+        resp = HTTP_CLIENT.get(
             f"https://api.modrinth.com/v2/project/{slug}/version",
             params={"loaders": f'["{loader}"]', "game_versions": f'["{mc_version}"]'},
-            timeout=10,
         )
         if resp.status_code == 200:
             versions = resp.json()
@@ -97,11 +136,11 @@ def sync_mod(
     with open(github_output, "a") as f:
         f.write(f"action={action}\n")
 
+    start = time.monotonic()
     for attempt in range(1, MAX_RETRIES + 1):
         # For modrinth, check API first to avoid unnecessary packwiz calls
         if platform == "mr" and attempt > 1 and not check_modrinth_version(mod_slug, version, mc_version, loader):
-            log(f"Attempt {attempt}/{MAX_RETRIES}: Version not on Modrinth yet, waiting {RETRY_INTERVAL}s...")
-            time.sleep(RETRY_INTERVAL)
+            wait_for_retry(attempt, "Version not on Modrinth yet")
             continue
 
         # Run packwiz
@@ -112,13 +151,12 @@ def sync_mod(
         if not success:
             # Check if it's a "not found" error vs other error
             if "could not find" in output.lower() or "no results" in output.lower():
-                log(f"Attempt {attempt}/{MAX_RETRIES}: Mod/version not found yet, waiting {RETRY_INTERVAL}s...")
-                time.sleep(RETRY_INTERVAL)
+                wait_for_retry(attempt, "Mod/version not found yet")
                 continue
             else:
                 log(f"Packwiz error: {output}")
                 # Still retry - might be transient
-                time.sleep(RETRY_INTERVAL)
+                wait_for_retry(attempt, "Packwiz failed")
                 continue
 
         # Check if changes were made
@@ -126,10 +164,9 @@ def sync_mod(
             log(f"Success: {action} completed for {mod_slug}")
             return True
 
-        log(f"Attempt {attempt}/{MAX_RETRIES}: No changes detected, waiting {RETRY_INTERVAL}s...")
-        time.sleep(RETRY_INTERVAL)
+        wait_for_retry(attempt, "No changes detected")
 
-    log(f"Error: Timed out after {MAX_RETRIES * RETRY_INTERVAL // 60} minutes")
+    log(f"Error: Timed out after {int(time.monotonic() - start) // 60} minutes")
     return False
 
 
@@ -1,9 +1,7 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
-# dependencies = [
-#     "pyfzf>=0.3.1",
-# ]
+# dependencies = []
 # ///
 """
 Setup script for mod-release-workflow.
@@ -16,14 +14,15 @@ Usage:
 
 import json
 import os
+import re
 import subprocess
 import sys
-import tomllib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
-from pyfzf.pyfzf import FzfPrompt
-
 
 @dataclass
 class ConfigItem:
@@ -34,7 +33,18 @@ class ConfigItem:
     default: str = ""
 
 
+@dataclass
+class PendingWrite:
+    item: ConfigItem
+    value: str
+    at_org: bool
+
+
 ALLOWED_LOADERS = {"forge"}
+# jq's @tsv escapes these in field values
+TSV_ESCAPE = re.compile(r"\\([tnr\\])")
+TSV_UNESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+PRUNED_DIRS = {".git", ".gradle", "build", "node_modules", "out", "run", "target"}
 
 
 class SetupCancelled(Exception):
@@ -76,13 +86,33 @@ def build_file_items(repo_name: str) -> list[ConfigItem]:
     ]
 
 
-def run_cmd(cmd: list[str], check: bool = True) -> subprocess.CompletedProcess[str]:
-    env = {k: v for k, v in os.environ.items() if k != "GITHUB_TOKEN"}
-    return subprocess.run(cmd, capture_output=True, text=True, check=check, env=env)
+def run_cmd(cmd: list[str], check: bool = True, discard: bool = False) -> subprocess.CompletedProcess[str]:
+    if discard:
+        # Only the exit status matters; don't create (and decode) output pipes
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True, check=check)
+    return subprocess.run(cmd, capture_output=True, text=True, check=check)
+
+
+def walk_mods_toml(root: Path) -> list[Path]:
+    paths: list[Path] = []
+    pending = deque([os.fspath(root)])
+    while pending:
+        try:
+            scanner = os.scandir(pending.popleft())
+        except OSError:  # unreadable directory; skip it as Path.rglob did
+            continue
+        with scanner as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in PRUNED_DIRS:
+                        pending.append(entry.path)
+                elif entry.name == "mods.toml" and entry.is_file():
+                    paths.append(Path(entry.path))
+    return paths
 
 
 def find_mods_toml() -> Path:
-    paths = [path for path in Path(".").rglob("mods.toml") if path.is_file() and "build" not in path.parts]
+    paths = walk_mods_toml(Path("."))
     if not paths:
         sys.exit("ERROR: No mods.toml found. Expected a single mods.toml with a [mc-publish] table.")
     if len(paths) > 1:
@@ -91,14 +121,21 @@ def find_mods_toml() -> Path:
     return paths[0]
 
 
-def read_mc_publish_table(mods_toml: Path) -> dict[str, str]:
+def read_mc_publish_table(mods_toml: Path, text: str, lines: list[str]) -> dict[str, str]:
+    import tomllib
+
     try:
-        block_text = extract_mc_publish_block(mods_toml.read_text())
+        data = tomllib.loads(text)
+    except tomllib.TOMLDecodeError:
+        # Gradle-templated files (e.g. `[[dependencies.${mod_id}]]`) are not valid TOML as a
+        # whole; only the [mc-publish] table has to be, so retry with just that table.
+        block_text = extract_mc_publish_block(lines)
         if block_text is None:
             return {}
-        data = tomllib.loads(block_text)
-    except tomllib.TOMLDecodeError as exc:
-        sys.exit(f"ERROR: Invalid TOML in {mods_toml}: {exc}")
+        try:
+            data = tomllib.loads(block_text)
+        except tomllib.TOMLDecodeError as exc:
+            sys.exit(f"ERROR: Invalid TOML in {mods_toml}: {exc}")
     table = data.get("mc-publish")
     if table is None:
         return {}
@@ -129,28 +166,26 @@ def strip_inline_comment(line: str) -> str:
     return line.split("#", 1)[0].strip()
 
 
-def is_table_header(line: str) -> bool:
-    stripped = strip_inline_comment(line)
+def is_table_header(stripped: str) -> bool:
     return stripped.startswith("[") and stripped.endswith("]")
 
 
-def is_mc_publish_header(line: str) -> bool:
-    stripped = strip_inline_comment(line)
+def is_mc_publish_header(stripped: str) -> bool:
     return stripped.startswith("[mc-publish") or stripped.startswith("[[mc-publish")
 
 
-def extract_mc_publish_block(text: str) -> str | None:
-    lines = text.splitlines()
-    header_indices = [index for index, line in enumerate(lines) if strip_inline_comment(line) == "[mc-publish]"]
-    if not header_indices:
+def extract_mc_publish_block(lines: list[str]) -> str | None:
+    stripped_lines = [strip_inline_comment(line) for line in lines]
+    header_count = stripped_lines.count("[mc-publish]")
+    if not header_count:
         return None
-    if len(header_indices) > 1:
+    if header_count > 1:
         sys.exit("ERROR: Multiple [mc-publish] tables found in mods.toml")
 
-    start_index = header_indices[0]
+    start_index = stripped_lines.index("[mc-publish]")
     end_index = len(lines)
     for index in range(start_index + 1, len(lines)):
-        if is_table_header(lines[index]) and not is_mc_publish_header(lines[index]):
+        if is_table_header(stripped_lines[index]) and not is_mc_publish_header(stripped_lines[index]):
             end_index = index
             break
 
@@ -165,38 +200,50 @@ def build_mc_publish_block(values: dict[str, str], ordered_keys: list[str]) -> l
     return lines
 
 
-def update_mc_publish_block(mods_toml: Path, values: dict[str, str], ordered_keys: list[str]) -> bool:
-    text = mods_toml.read_text()
-    lines = text.splitlines()
+def update_mc_publish_block(
+    mods_toml: Path, text: str, lines: list[str], values: dict[str, str], ordered_keys: list[str]
+) -> bool:
+    # Single pass: find the header, then record key positions (relative to the block) until the next table
     start_index: int | None = None
-    for index, line in enumerate(lines):
-        if strip_inline_comment(line) == "[mc-publish]":
-            start_index = index
-            break
-
-    if start_index is not None:
-        end_index = len(lines)
-        for index in range(start_index + 1, len(lines)):
-            if is_table_header(lines[index]) and not is_mc_publish_header(lines[index]):
+    end_index = len(lines)
+    key_indices: dict[str, int] = {}
+    # Substring search runs in C; if the header text appears nowhere there is no block to walk for
+    if "[mc-publish]" in text:
+        for index, line in enumerate(lines):
+            stripped = strip_inline_comment(line)
+            if start_index is None:
+                if stripped == "[mc-publish]":
+                    start_index = index
+                continue
+            if not stripped:
+                # Blank and comment-only lines are common in generated files; skip them before any other work
+                continue
+            if is_table_header(stripped) and not is_mc_publish_header(stripped):
                 end_index = index
                 break
-        block_lines = lines[start_index + 1 : end_index]
-        key_indices: dict[str, int] = {}
-        for index, line in enumerate(block_lines):
-            stripped = strip_inline_comment(line)
-            if "=" not in stripped:
+            key, sep, _ = stripped.partition("=")
+            if not sep:
                 continue
-            key = stripped.split("=", 1)[0].strip()
+            key = key.strip()
             if key in values and key not in key_indices:
-                key_indices[key] = index
+                key_indices[key] = index - start_index - 1
 
+    if start_index is not None:
+        block_lines = lines[start_index + 1 : end_index]
+        mutated = False
         for key in ordered_keys:
             new_line = f"{key} = {format_toml_value(key, values[key])}"
             if key in key_indices:
-                block_lines[key_indices[key]] = new_line
+                if block_lines[key_indices[key]] != new_line:
+                    block_lines[key_indices[key]] = new_line
+                    mutated = True
             else:
                 block_lines.append(new_line)
+                mutated = True
 
+        # Values already match: skip building and comparing the whole file
+        if not mutated:
+            return False
         new_lines = lines[: start_index + 1] + block_lines + lines[end_index:]
     else:
         new_block = build_mc_publish_block(values, ordered_keys)
@@ -205,86 +252,125 @@ def update_mc_publish_block(mods_toml: Path, values: dict[str, str], ordered_key
             new_lines.append("")
         new_lines.extend(new_block)
 
-    new_text = "\n".join(new_lines) + "\n"
-    if new_text != text:
-        mods_toml.write_text(new_text)
-        return True
-    return False
+    mods_toml.write_text("\n".join(new_lines) + "\n")
+    return True
 
 
 def require_tools() -> None:
     """Crash if required tools are missing."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        gh_check = executor.submit(run_cmd, ["gh", "--version"], discard=True)
+        fzf_check = executor.submit(run_cmd, ["fzf", "--version"], discard=True)
+
     try:
-        run_cmd(["gh", "--version"])
+        gh_check.result()
     except (subprocess.CalledProcessError, FileNotFoundError):
         sys.exit("ERROR: gh CLI required. Install from https://cli.github.com/")
 
     try:
-        run_cmd(["fzf", "--version"])
+        fzf_check.result()
     except (subprocess.CalledProcessError, FileNotFoundError):
         sys.exit("ERROR: fzf required. Install with: brew install fzf")
 
 
-def get_repo_info() -> tuple[str, str]:
-    """Get current repo's org/repo from git remote."""
-    result = run_cmd(["gh", "repo", "view", "--json", "owner,name"], check=False)
+def get_repo_info() -> tuple[str, str, bool]:
+    """Get current repo's org/repo from git remote, and whether the owner is an organization."""
+    result = run_cmd(["gh", "repo", "view", "--json", "owner,name,isInOrganization"], check=False)
     if result.returncode != 0:
         sys.exit("ERROR: Not in a GitHub repository or gh not authenticated.\nRun 'gh auth login' first.")
     data = json.loads(result.stdout)
-    return data["owner"]["login"], data["name"]
+    return data["owner"]["login"], data["name"], data["isInOrganization"]
 
 
 class ExistingValues:
-    """Cache of existing secrets/variables fetched once at startup."""
+    """Cache of existing secrets/variables, fetched in the background at startup."""
 
-    def __init__(self, org: str, repo: str):
+    def __init__(self, org: str, repo: str, in_org: bool):
         self.repo_secrets: set[str] = set()
         self.org_secrets: set[str] = set()
         self.repo_vars: dict[str, str] = {}
         self.org_vars: dict[str, str] = {}
-        self._fetch_all(org, repo)
-
-    def _fetch_all(self, org: str, repo: str) -> None:
-        def safe_json(result: subprocess.CompletedProcess[str], key: str | None = None) -> list:
-            if result.returncode != 0:
-                return []
-            try:
-                data = json.loads(result.stdout)
-                return data[key] if key else data
-            except (json.JSONDecodeError, KeyError):
-                return []
-
-        self.repo_secrets = {
-            s["name"] for s in safe_json(run_cmd(["gh", "secret", "list", "--json", "name"], check=False))
-        }
-        self.repo_vars = {
-            v["name"]: v["value"]
-            for v in safe_json(run_cmd(["gh", "variable", "list", "--json", "name,value"], check=False))
-        }
-
-        # Org secrets/vars available to this repo (doesn't require admin:org scope)
-        self.org_secrets = {
-            s["name"]
-            for s in safe_json(
-                run_cmd(["gh", "api", f"repos/{org}/{repo}/actions/organization-secrets"], check=False), "secrets"
+        # (name, is_secret) -> (repo_value, org_value), built once the fetch completes
+        self.lookup: dict[tuple[str, bool], tuple[str | None, str | None]] = {}
+        # The gh round trips overlap with the interactive mods.toml prompts; get() waits for them.
+        # A daemon thread, so cancelling or failing before then exits without waiting on gh.
+        self._fetch_error: Exception | None = None
+        self._fetcher = threading.Thread(target=self._fetch_in_background, args=(org, repo, in_org), daemon=True)
+        self._fetcher.start()
+
+    def _fetch_in_background(self, org: str, repo: str, in_org: bool) -> None:
+        # An exception would otherwise die with the thread; keep it for get() to report
+        try:
+            self._fetch_all(org, repo, in_org)
+        except Exception as exc:
+            self._fetch_error = exc
+
+    def _fetch_all(self, org: str, repo: str, in_org: bool) -> None:
+        # gh projects the JSON with --jq, so Python only splits lines (and tab-separated name/value pairs)
+        def start(cmd: list[str]) -> subprocess.Popen[str]:
+            # No stdin: these run while fzf/input()/getpass own the terminal
+            return subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+
+        def output(proc: subprocess.Popen[str]) -> str:
+            stdout, _ = proc.communicate()
+            return stdout if proc.returncode == 0 else ""
+
+        def names(stdout: str) -> set[str]:
+            return {line for line in stdout.split("\n") if line}
+
+        def name_values(stdout: str) -> dict[str, str]:
+            pairs = (line.partition("\t") for line in stdout.split("\n") if line)
+            return {name: TSV_ESCAPE.sub(lambda m: TSV_UNESCAPES[m.group(1)], value) for name, _, value in pairs}
+
+        # Pass the already-resolved repo so gh doesn't re-derive it from git remotes on every call
+        repo_flag = ["--repo", f"{org}/{repo}"]
+        # The lookups are independent network round trips, so start every gh process before waiting on any.
+        # (Plain processes rather than a thread pool: pool workers would be joined at interpreter exit.)
+        repo_secrets = start(["gh", "secret", "list", *repo_flag, "--json", "name", "--jq", ".[].name"])
+        repo_vars = start(
+            ["gh", "variable", "list", *repo_flag, "--json", "name,value", "--jq", ".[] | [.name, .value] | @tsv"]
+        )
+        # Org secrets/vars available to this repo (doesn't require admin:org scope).
+        # User-owned repos have none, so don't spend two round trips finding that out.
+        if in_org:
+            org_secrets = start(
+                ["gh", "api", f"repos/{org}/{repo}/actions/organization-secrets", "--jq", ".secrets[].name"]
             )
-        }
-        self.org_vars = {
-            v["name"]: v["value"]
-            for v in safe_json(
-                run_cmd(["gh", "api", f"repos/{org}/{repo}/actions/organization-variables"], check=False), "variables"
+            org_vars = start(
+                [
+                    "gh",
+                    "api",
+                    f"repos/{org}/{repo}/actions/organization-variables",
+                    "--jq",
+                    ".variables[] | [.name, .value] | @tsv",
+                ]
             )
-        }
+
+        self.repo_secrets = names(output(repo_secrets))
+        self.repo_vars = name_values(output(repo_vars))
+        if in_org:
+            self.org_secrets = names(output(org_secrets))
+            self.org_vars = name_values(output(org_vars))
+
+        for name in self.repo_secrets | self.org_secrets:
+            self.lookup[name, True] = (
+                "***" if name in self.repo_secrets else None,
+                "***" if name in self.org_secrets else None,
+            )
+        for name in self.repo_vars.keys() | self.org_vars.keys():
+            self.lookup[name, False] = (self.repo_vars.get(name), self.org_vars.get(name))
 
     def get(self, name: str, is_secret: bool) -> tuple[str | None, str | None]:
         """Returns (repo_value, org_value)."""
-        if is_secret:
-            repo = "***" if name in self.repo_secrets else None
-            org = "***" if name in self.org_secrets else None
-        else:
-            repo = self.repo_vars.get(name)
-            org = self.org_vars.get(name)
-        return repo, org
+        if self._fetcher.is_alive():
+            print("\nFetching existing values...")
+            self._fetcher.join()
+        if self._fetch_error is not None:
+            print(f"WARNING: Could not fetch existing secrets/variables ({self._fetch_error}); none will be shown.")
+            self._fetch_error = None
+        return self.lookup.get((name, is_secret), (None, None))
 
 
 def set_value(name: str, value: str, is_secret: bool, at_org: bool, org: str) -> bool:
@@ -298,7 +384,7 @@ def set_value(name: str, value: str, is_secret: bool, at_org: bool, org: str) ->
             cmd = ["gh", "variable", "set", name, "--body", value]
             if at_org:
                 cmd.extend(["--org", org])
-        run_cmd(cmd)
+        run_cmd(cmd, discard=True)
         return True
     except subprocess.CalledProcessError:
         return False
@@ -306,19 +392,28 @@ def set_value(name: str, value: str, is_secret: bool, at_org: bool, org: str) ->
 
 def fzf_select(prompt: str, options: list[str]) -> str | None:
     """Use fzf for selection."""
-    fzf = FzfPrompt()
-    args = f"--prompt='{prompt}: ' --height=40% --reverse"
+    if len(options) == 1:
+        # Nothing to choose; skip the fzf round trip
+        return options[0]
+    # Options go in on stdin and the pick comes back on stdout; fzf draws its UI on the tty itself
     try:
-        result = fzf.prompt(options, args)
+        result = subprocess.run(
+            ["fzf", f"--prompt={prompt}: ", "--height=40%", "--reverse"],
+            input="\n".join(options),
+            stdout=subprocess.PIPE,
+            text=True,
+        )
     except KeyboardInterrupt as exc:
         raise SetupCancelled from exc
-    if not result:
+    selection = result.stdout.splitlines()
+    if result.returncode != 0 or not selection:
         raise SetupCancelled
-    return result[0]
+    return selection[0]
 
 
 def configure_file_item(item: ConfigItem, existing_values: dict[str, str], actions: list[str]) -> str | None:
     """Configure a single mods.toml [mc-publish] entry."""
+    print(f"\n{item.name}: {item.description}")
     existing_value = existing_values.get(item.name)
     if existing_value is not None:
         is_valid, reason = validate_file_value(item.name, existing_value)
@@ -366,8 +461,8 @@ def configure_file_item(item: ConfigItem, existing_values: dict[str, str], actio
         return value
 
 
-def configure_item(item: ConfigItem, org: str, cache: ExistingValues, actions: list[str]) -> None:
-    """Configure a single variable or secret."""
+def configure_item(item: ConfigItem, cache: ExistingValues, pending: list[PendingWrite], actions: list[str]) -> None:
+    """Configure a single variable or secret; new values are queued in `pending`."""
     print(f"\n{'=' * 50}")
     print(f"{item.name}: {item.description}")
     if item.required:
@@ -423,32 +518,50 @@ def configure_item(item: ConfigItem, org: str, cache: ExistingValues, actions: l
             print("Skipped (no value)")
             return
 
-        if set_value(item.name, value, item.is_secret, at_org, org):
-            scope = "org" if at_org else "repo"
-            print(f"Set {item.name} at {scope} level")
-            actions.append(f"{item.name}: set at {scope} level")
-            return
+        pending.append(PendingWrite(item, value, at_org))
+        return
 
-        print(f"ERROR: Failed to set {item.name}")
-        if not item.required:
-            return
+
+def apply_pending(pending: list[PendingWrite], org: str, actions: list[str]) -> list[PendingWrite]:
+    """Write queued variables/secrets in parallel. Returns the writes that failed."""
+    if not pending:
+        return []
+
+    print("\nSaving values...")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(
+            executor.map(lambda p: set_value(p.item.name, p.value, p.item.is_secret, p.at_org, org), pending)
+        )
+
+    failed: list[PendingWrite] = []
+    for write, ok in zip(pending, results, strict=True):
+        scope = "org" if write.at_org else "repo"
+        if ok:
+            print(f"Set {write.item.name} at {scope} level")
+            actions.append(f"{write.item.name}: set at {scope} level")
+        else:
+            print(f"ERROR: Failed to set {write.item.name} at {scope} level")
+            failed.append(write)
+    return failed
 
 
 def check_workflow_file() -> None:
     """Check if the caller workflow exists."""
     workflows_dir = Path(".github/workflows")
     if workflows_dir.exists():
-        for ext in ("*.yaml", "*.yml"):
-            for wf in workflows_dir.glob(ext):
-                if "mod-release-workflow" in wf.read_text():
-                    print(f"Found workflow: {wf}")
-                    return
+        # One directory listing for both extensions; stop at the first caller found
+        for wf in workflows_dir.iterdir():
+            if wf.suffix in (".yaml", ".yml") and b"mod-release-workflow" in wf.read_bytes():
+                print(f"Found workflow: {wf}")
+                return
 
     print("\nWARNING: No mod-release-workflow found in .github/workflows/")
     print("Copy caller-template.yaml first")
 
 
 def main() -> int:
+    # gh prefers GITHUB_TOKEN over the user's login; drop it once so every child process inherits the scrubbed env
+    os.environ.pop("GITHUB_TOKEN", None)
     try:
         print("=" * 50)
         print("Mod Release Workflow Setup")
@@ -456,13 +569,18 @@ def main() -> int:
 
         require_tools()
 
-        org, repo = get_repo_info()
+        org, repo, in_org = get_repo_info()
         print(f"\nRepository: {org}/{repo}")
 
+        cache = ExistingValues(org, repo, in_org)
+
         check_workflow_file()
 
         mods_toml = find_mods_toml()
-        existing_mc_publish = read_mc_publish_table(mods_toml)
+        # Read once: the same text feeds both the initial values and the rewrite below
+        mods_toml_text = mods_toml.read_text()
+        mods_toml_lines = mods_toml_text.splitlines()
+        existing_mc_publish = read_mc_publish_table(mods_toml, mods_toml_text, mods_toml_lines)
         file_items = build_file_items(repo)
 
         print(f"\nFound mods.toml: {mods_toml}")
@@ -481,14 +599,26 @@ def main() -> int:
             sys.exit(f"ERROR: Missing required mods.toml values: {missing_list}")
 
         ordered_keys = [item.name for item in file_items]
-        updated = update_mc_publish_block(mods_toml, file_values, ordered_keys)
+        updated = update_mc_publish_block(mods_toml, mods_toml_text, mods_toml_lines, file_values, ordered_keys)
         if updated:
             actions.append(f"mods.toml: updated [mc-publish] ({mods_toml})")
 
-        print("\nFetching existing values...")
-        cache = ExistingValues(org, repo)
-        for item in VARIABLES + SECRETS:
-            configure_item(item, org, cache, actions)
+        pending: list[PendingWrite] = []
+        failed: list[PendingWrite] = []
+        items = VARIABLES + SECRETS
+        try:
+            while items:
+                for item in items:
+                    configure_item(item, cache, pending, actions)
+                failed += apply_pending(pending, org, actions)
+                pending = []
+                # Ask again for required items whose write failed; optional ones are reported below
+                items = [write.item for write in failed if write.item.required]
+                failed = [write for write in failed if not write.item.required]
+        except (SetupCancelled, KeyboardInterrupt, EOFError):
+            # Save the answers given so far before propagating the cancel
+            apply_pending(pending, org, actions)
+            raise
 
         print("\n" + "=" * 50)
         print("Setup complete!")
@@ -501,6 +631,13 @@ def main() -> int:
         else:
             print("\nNo changes made.")
 
+        if failed:
+            print("\nERROR: Failed to set the following; set them manually with:")
+            for write in failed:
+                kind = "secret" if write.item.is_secret else "variable"
+                org_flag = f" --org {org}" if write.at_org else ""
+                print(f"  gh {kind} set {write.item.name}{org_flag}")
+            return 1
         return 0
     except (SetupCancelled, KeyboardInterrupt, EOFError):
         print("\nCancelled.")